@@ -0,0 +1,13 @@
+def query_budget(**budgets):
+    """Задаёт максимальное число SQL-запросов для action представления."""
+
+    def decorator(view_class):
+        view_class.query_budgets = {
+            **getattr(view_class, 'query_budgets', {}), **budgets}
+        return view_class
+
+    return decorator
+
+
+def get_query_budget(view_class, action):
+    return getattr(view_class, 'query_budgets', {}).get(action)
@@ -0,0 +1,108 @@
+import gzip
+import hashlib
+import re
+from collections import namedtuple
+
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from recipes.constants import CATALOG_VERSION
+from recipes.models import Ingredient, Tag
+from recipes.versions import VersionedState
+
+from .renderers import FastJSONRenderer
+
+GZIP_RE = re.compile(r'\bgzip\b')
+
+TagState = namedtuple('TagState', ('by_id', 'id_by_slug'))
+
+
+def accepts_gzip(request):
+    return bool(GZIP_RE.search(request.META.get('HTTP_ACCEPT_ENCODING', '')))
+
+
+def get_catalog_etag(request, version, encoding=''):
+    query = '&'.join(f'{key}={value}'
+                     for key, value in sorted(request.GET.items()))
+    digest = hashlib.sha1(
+        f'{request.path}?{query}'.encode()).hexdigest()[:16]
+    suffix = f'-{encoding}' if encoding else ''
+    return f'"{version}-{digest}{suffix}"'
+
+
+def conditional_response(request, etag, build_response):
+    if_none_match = {
+        tag.removeprefix('W/')
+        for tag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))}
+    if etag in if_none_match or '*' in if_none_match:
+        response = HttpResponseNotModified()
+    else:
+        response = build_response()
+    response['ETag'] = etag
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+class TagRegistry(VersionedState):
+    """Сериализованные теги в памяти процесса, по id."""
+
+    version_name = CATALOG_VERSION
+
+    def build(self, version):
+        by_id = {tag['id']: tag
+                 for tag in Tag.objects.values('id', 'name', 'color', 'slug')}
+        return TagState(by_id,
+                        {tag['slug']: pk for pk, tag in by_id.items()})
+
+    def get(self, pk):
+        return self.get_state().by_id.get(pk)
+
+    def get_many(self, ids):
+        tags = self.get_state().by_id
+        return [tags[pk] for pk in ids if pk in tags]
+
+    def get_ids(self, slugs):
+        id_by_slug = self.get_state().id_by_slug
+        return [id_by_slug[slug] for slug in slugs if slug in id_by_slug]
+
+    def all(self):
+        return list(self.get_state().by_id.values())
+
+
+tag_registry = TagRegistry()
+
+
+class CatalogSnapshot(VersionedState):
+    """Готовое JSON-представление справочника и его gzip-версия."""
+
+    version_name = CATALOG_VERSION
+
+    def __init__(self, get_data):
+        super().__init__()
+        self.get_data = get_data
+
+    def build(self, version):
+        content = FastJSONRenderer().render(self.get_data())
+        return version, content, gzip.compress(content)
+
+    def response(self, request):
+        version, content, compressed = self.get_state()
+        if accepts_gzip(request):
+            encoding, body = 'gzip', compressed
+        else:
+            encoding, body = '', content
+
+        def build_response():
+            response = HttpResponse(body, content_type='application/json')
+            if encoding:
+                response['Content-Encoding'] = encoding
+            return response
+
+        return conditional_response(
+            request, get_catalog_etag(request, version, encoding),
+            build_response)
+
+
+ingredient_snapshot = CatalogSnapshot(
+    lambda: list(Ingredient.objects.values('id', 'name', 'measurement_unit')))
+tag_snapshot = CatalogSnapshot(tag_registry.all)
@@ -1,2 +1,30 @@
 PAGE_SIZE = 6
 MAX_PAGE_SIZE = 20
+SEARCH_RESULTS_LIMIT = 10
+TRIGRAM_SIMILARITY_THRESHOLD = 0.6
+AUTOCOMPLETE_PAGE_SIZE = 10
+AUTOCOMPLETE_MAX_PAGE_SIZE = 30
+INGREDIENT_USAGE_TTL = 300
+QUERY_BUDGET_SIZES = (2, 6)
+COUNT_CACHE_TTL = 30
+COUNT_ESTIMATE_THRESHOLD = 100_000
+MEMBERSHIP_CACHE_TTL = 60 * 60
+RECIPE_CARD_TTL = 24 * 60 * 60
+RECIPE_COMPACT_FIELDS = ('id', 'tags', 'name', 'image', 'image_renditions',
+                         'cooking_time')
+RECIPE_CARD_SCHEMA = 3
+JSON_BENCHMARK_REPEAT = 200
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_LEVEL = 6
+COMPRESSION_CACHE_SIZE = 64
+RECIPE_SNIPPET_WORDS = 30
+SNIPPET_START = '<mark>'
+SNIPPET_STOP = '</mark>'
+COVERAGE_PRECISION = 4
+IMAGE_MAX_SIZE = 10 * 1024 * 1024
+IMAGE_MAX_SIDE = 8000
+BASE64_CHUNK_SIZE = 64 * 1024
+BASE64_HEADER_MAX_LEN = 100
+MATCHING_MAX_IDS = 1000
+MATCHING_MAX_CHANGES = 1000
+MATCHING_CHANGE_TTL = 24 * 60 * 60
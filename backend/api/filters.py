@@ -1,27 +1,85 @@
 import django_filters
+from django.db.models import Exists, OuterRef
 from recipes.models import Recipe
+from recipes.utils import normalize_search_name
 from rest_framework import filters
 
+from .catalog import tag_registry
+from .matching import (annotate_coverage, exclude_any_ingredients,
+                       filter_all_ingredients, parse_ids)
+from .membership import get_membership
+from .search import search_recipes
+
+RANK_ANNOTATIONS = ('search_rank', 'ingredient_coverage')
+
 
 class IngredientsSearch(filters.BaseFilterBackend):
     def filter_queryset(self, request, queryset, view):
         search_query = request.query_params.get('name', None)
         if search_query:
-            queryset = queryset.filter(name__istartswith=search_query)
+            queryset = queryset.filter(
+                search_name__startswith=normalize_search_name(search_query))
         return queryset
 
 
 class RecipeFilter(django_filters.FilterSet):
     author = django_filters.CharFilter(field_name='author__id')
     tags = django_filters.CharFilter(method='filter_tags')
+    search = django_filters.CharFilter(method='filter_search')
+    ingredients = django_filters.CharFilter(method='filter_ingredients')
+    exclude_ingredients = django_filters.CharFilter(
+        method='filter_exclude_ingredients')
 
     class Meta:
         model = Recipe
-        fields = ['author', 'tags']
+        fields = ['author', 'tags', 'search', 'ingredients',
+                  'exclude_ingredients']
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
+    def filter_ingredients(self, queryset, name, value):
+        ingredient_ids = parse_ids(self.request.GET.getlist(name))
+        if not ingredient_ids:
+            return queryset.none()
+        if self.request.GET.get('ingredients_match') == 'coverage':
+            return annotate_coverage(queryset, ingredient_ids)
+        return filter_all_ingredients(queryset, ingredient_ids)
+
+    def filter_exclude_ingredients(self, queryset, name, value):
+        ingredient_ids = parse_ids(self.request.GET.getlist(name))
+        if not ingredient_ids:
+            return queryset
+        return exclude_any_ingredients(queryset, ingredient_ids)
 
     def filter_tags(self, queryset, name, value):
-        tags = self.request.GET.getlist('tags')
-        return queryset.filter(tag__slug__in=tags).distinct()
+        slugs = set(self.request.GET.getlist('tags'))
+        tag_ids = tag_registry.get_ids(slugs)
+        recipe_tags = Recipe.tag.through.objects.filter(
+            recipe_id=OuterRef('pk'))
+        if self.request.GET.get('tags_match') == 'all':
+            if len(tag_ids) != len(slugs):
+                return queryset.none()
+            for tag_id in tag_ids:
+                queryset = queryset.filter(
+                    Exists(recipe_tags.filter(tag_id=tag_id)))
+            return queryset
+        if not tag_ids:
+            return queryset.none()
+        return queryset.filter(Exists(recipe_tags.filter(tag_id__in=tag_ids)))
+
+
+class RecipeOrderingFilter(filters.OrderingFilter):
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if request.query_params.get(self.ordering_param):
+            return ordering
+        # Фильтры могут вернуть none() без аннотаций, сортировать по ним
+        # можно только если они есть.
+        for annotation in RANK_ANNOTATIONS:
+            if annotation in queryset.query.annotations:
+                ordering = (f'-{annotation}', *ordering)
+        return ordering
 
 
 class CustomFilterBackend(filters.BaseFilterBackend):
@@ -31,17 +89,17 @@ class CustomFilterBackend(filters.BaseFilterBackend):
     def filter_queryset(self, request, queryset, view):
         is_favorite = request.query_params.get('is_favorited')
         is_in_shopping_cart = request.query_params.get('is_in_shopping_cart')
-        user = request.user
+        membership = get_membership(request)
 
         if is_favorite is not None:
             is_favorite = self._parse_boolean_param(is_favorite)
             if is_favorite:
-                queryset = queryset.filter(favorite__user=user)
+                queryset = queryset.filter(id__in=membership.favorites)
 
         if is_in_shopping_cart is not None:
             is_in_shopping_cart = self._parse_boolean_param(
                 is_in_shopping_cart)
             if is_in_shopping_cart:
-                queryset = queryset.filter(buylist__user=user)
+                queryset = queryset.filter(id__in=membership.cart)
 
         return queryset
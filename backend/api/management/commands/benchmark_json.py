@@ -0,0 +1,75 @@
+import io
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from recipes.models import Ingredient
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from ...constants import JSON_BENCHMARK_REPEAT, MAX_PAGE_SIZE
+from ...parsers import FastJSONParser
+from ...renderers import FastJSONRenderer, orjson
+from ...serializers import RecipeSerializer
+from ...views import RecipeViewSet
+
+
+def measure(function, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return result, (time.perf_counter() - started) / repeat
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает скорость JSONRenderer/JSONParser и их быстрых '
+            'версий на данных из БД.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=MAX_PAGE_SIZE,
+                            help='Количество рецептов в ответе.')
+        parser.add_argument('--repeat', type=int,
+                            default=JSON_BENCHMARK_REPEAT,
+                            help='Количество повторов каждого замера.')
+
+    def get_payloads(self, limit):
+        request = RequestFactory().get('/api/recipes/')
+        request.user = AnonymousUser()
+        recipes = RecipeViewSet.queryset.order_by('-pub_date')[:limit]
+        return (
+            ('recipes', RecipeSerializer(
+                recipes, many=True, context={'request': request}).data),
+            ('ingredients', list(Ingredient.objects.values(
+                'id', 'name', 'measurement_unit'))),
+        )
+
+    def benchmark(self, name, data, repeat):
+        content, render_time = measure(
+            lambda: JSONRenderer().render(data), repeat)
+        fast_content, fast_render_time = measure(
+            lambda: FastJSONRenderer().render(data), repeat)
+        if content != fast_content:
+            raise CommandError(f'{name}: ответы рендереров различаются.')
+        parsed, parse_time = measure(
+            lambda: JSONParser().parse(io.BytesIO(content)), repeat)
+        fast_parsed, fast_parse_time = measure(
+            lambda: FastJSONParser().parse(io.BytesIO(content)), repeat)
+        if parsed != fast_parsed:
+            raise CommandError(f'{name}: результаты парсеров различаются.')
+        self.stdout.write(
+            f'{name} ({len(content)} байт): '
+            f'render {render_time * 1000:.3f} → '
+            f'{fast_render_time * 1000:.3f} мс, '
+            f'parse {parse_time * 1000:.3f} → '
+            f'{fast_parse_time * 1000:.3f} мс')
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING(
+                'orjson не установлен, быстрые классы используют json.'))
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for name, data in self.get_payloads(options['limit']):
+                self.benchmark(name, data, options['repeat'])
+        self.stdout.write(self.style.SUCCESS('Ответы совпадают побайтово.'))
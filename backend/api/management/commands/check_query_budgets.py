@@ -0,0 +1,174 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLResolver, reverse
+from recipes.models import (BuyList, Favorite, Ingredient, IngredientRecipe,
+                            Recipe, Tag)
+from rest_framework.test import APIClient
+from users.models import Subscription
+
+from ... import urls
+from ...budgets import get_query_budget
+from ...constants import MAX_PAGE_SIZE, QUERY_BUDGET_SIZES
+
+User = get_user_model()
+
+LOCMEM_CACHE = 'django.core.cache.backends.locmem.LocMemCache'
+
+
+def get_private_caches():
+    return {alias: {'BACKEND': LOCMEM_CACHE,
+                    'LOCATION': f'query-budgets-{alias}'}
+            for alias in settings.CACHES}
+
+
+def reset_caches():
+    # Версии данных растут только on_commit, а фикстура живёт в
+    # откатываемой транзакции: сброс кешей заново задаёт все версии.
+    for cache in caches.all():
+        cache.clear()
+
+
+def iter_get_routes(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from iter_get_routes(pattern.url_patterns)
+            continue
+        view_class = getattr(pattern.callback, 'cls', None)
+        kwargs = pattern.pattern.regex.groupindex
+        if view_class is None or not pattern.name or 'format' in kwargs:
+            continue
+        actions = getattr(pattern.callback, 'actions', None)
+        if actions is None:
+            if not hasattr(view_class, 'get'):
+                continue
+            action = 'get'
+        elif 'get' in actions:
+            action = actions['get']
+        else:
+            continue
+        yield pattern.name, view_class, action, tuple(kwargs)
+
+
+class BudgetFixture:
+
+    def __init__(self):
+        self.user = User.objects.create(
+            username='budget_user', email='budget_user@example.com')
+        self.tags = [
+            Tag.objects.create(name=f'budget tag {index}', color='#000000',
+                               slug=f'budget-tag-{index}')
+            for index in range(2)
+        ]
+        self.ingredients = [
+            Ingredient.objects.create(name=f'budget ingredient {index}',
+                                      measurement_unit='г')
+            for index in range(3)
+        ]
+        self.recipes = []
+        self.authors = []
+
+    def grow(self, size):
+        for index in range(len(self.recipes), size):
+            author = User.objects.create(
+                username=f'budget_author_{index}',
+                email=f'budget_author_{index}@example.com')
+            recipe = Recipe.objects.create(
+                author=author, name=f'budget recipe {index}', text='text',
+                cooking_time=1, image='recipes/images/budget.jpg')
+            recipe.tag.set(self.tags)
+            IngredientRecipe.objects.bulk_create(
+                IngredientRecipe(recipe=recipe, ingredient=ingredient,
+                                 amount=1)
+                for ingredient in self.ingredients)
+            Subscription.objects.create(user=self.user, author=author)
+            Favorite.objects.create(user=self.user, recipe=recipe)
+            BuyList.objects.create(user=self.user, recipe=recipe)
+            self.authors.append(author)
+            self.recipes.append(recipe)
+
+    def get_lookup(self, kwarg, view_class):
+        if kwarg == 'recipe_id':
+            return self.recipes[0].id
+        if kwarg == 'author_id':
+            return self.authors[0].id
+        queryset = getattr(view_class, 'queryset', None)
+        if queryset is None:
+            return self.authors[0].id
+        return queryset.model.objects.order_by('pk').values_list(
+            'pk', flat=True).first()
+
+
+class Command(BaseCommand):
+    help = ('Проверяет, что GET-эндпоинты API укладываются в бюджет '
+            'SQL-запросов и число запросов не растёт с объёмом данных.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+',
+                            default=QUERY_BUDGET_SIZES,
+                            help='Количество рецептов в наборах данных.')
+
+    def measure(self, client, path):
+        # Бюджеты задаются для холодного кеша, чтобы N+1 при сборке
+        # карточек и пересборке данных в памяти не прятался за кешем.
+        reset_caches()
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(path)
+        return response.status_code, len(context)
+
+    def check_budgets(self, sizes):
+        fixture = BudgetFixture()
+        anonymous = APIClient()
+        authenticated = APIClient()
+        authenticated.force_authenticate(fixture.user)
+        clients = (('anonymous', anonymous),
+                   ('authenticated', authenticated))
+
+        errors = []
+        counts = defaultdict(dict)
+        for size in sorted(sizes):
+            fixture.grow(size)
+            reset_caches()
+            for name, view_class, action, kwargs in iter_get_routes(
+                    urls.urlpatterns):
+                budget = get_query_budget(view_class, action)
+                if budget is None:
+                    self.stdout.write(self.style.WARNING(
+                        f'{name}: бюджет для {action} не задан.'))
+                    continue
+                path = reverse(f'api:{name}', kwargs={
+                    kwarg: fixture.get_lookup(kwarg, view_class)
+                    for kwarg in kwargs})
+                path = f'{path}?limit={MAX_PAGE_SIZE}'
+                for client_name, client in clients:
+                    status_code, count = self.measure(client, path)
+                    label = f'{name} [{client_name}]'
+                    counts[label][size] = count
+                    if status_code >= 500:
+                        errors.append(f'{label}: статус {status_code}.')
+                    if count > budget:
+                        errors.append(
+                            f'{label}: {count} запросов при бюджете '
+                            f'{budget} (рецептов: {size}).')
+        for label, by_size in counts.items():
+            if len(set(by_size.values())) > 1:
+                errors.append(f'{label}: число запросов растёт с объёмом '
+                              f'данных {by_size}.')
+        return counts, errors
+
+    def handle(self, *args, **options):
+        with override_settings(ALLOWED_HOSTS=['testserver'],
+                               CACHES=get_private_caches()):
+            with transaction.atomic():
+                counts, errors = self.check_budgets(options['sizes'])
+                transaction.set_rollback(True)
+        for label, by_size in sorted(counts.items()):
+            self.stdout.write(f'{label}: {by_size}')
+        if errors:
+            raise CommandError('\n'.join(errors))
+        self.stdout.write(self.style.SUCCESS('Бюджеты запросов соблюдены.'))
@@ -0,0 +1,182 @@
+import heapq
+import threading
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Exists, FloatField, OuterRef, Value, When
+from recipes.models import IngredientRecipe
+
+from .constants import (COVERAGE_PRECISION, MATCHING_CHANGE_TTL,
+                        MATCHING_MAX_CHANGES, MATCHING_MAX_IDS)
+
+CHANGES_SEQUENCE_KEY = 'recipe_index:sequence'
+
+
+def _change_key(sequence):
+    return f'recipe_index:change:{sequence}'
+
+
+def parse_ids(values):
+    return {int(item) for value in values for item in value.split(',')
+            if item.strip().isdecimal()}
+
+
+def mark_recipes_changed(recipe_ids):
+    """После коммита записывает id рецептов в общий журнал изменений."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+
+    def record():
+        cache.add(CHANGES_SEQUENCE_KEY, 0, timeout=None)
+        try:
+            sequence = cache.incr(CHANGES_SEQUENCE_KEY)
+        except ValueError:
+            # Счётчик вытеснен: процессы увидят откат и перестроят индекс.
+            return
+        cache.set(_change_key(sequence), recipe_ids, MATCHING_CHANGE_TTL)
+
+    transaction.on_commit(record)
+
+
+class RecipeIngredientIndex:
+    """Инвертированный индекс: ингредиент -> отсортированные id рецептов.
+
+    Строится один раз, дальше обновляет только рецепты из журнала
+    изменений. Если журнал потерян или слишком длинный, перестраивается.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._sequence = None
+        self.postings = {}
+        self.ingredients = {}
+
+    def rebuild(self):
+        postings = defaultdict(list)
+        ingredients = defaultdict(set)
+        rows = IngredientRecipe.objects.order_by('recipe_id').values_list(
+            'ingredient_id', 'recipe_id')
+        for ingredient_id, recipe_id in rows.iterator():
+            postings[ingredient_id].append(recipe_id)
+            ingredients[recipe_id].add(ingredient_id)
+        self.postings = dict(postings)
+        self.ingredients = dict(ingredients)
+
+    def update(self, recipe_ids):
+        current = defaultdict(set)
+        rows = IngredientRecipe.objects.filter(
+            recipe_id__in=recipe_ids).values_list('ingredient_id', 'recipe_id')
+        for ingredient_id, recipe_id in rows:
+            current[recipe_id].add(ingredient_id)
+        for recipe_id in recipe_ids:
+            old = self.ingredients.pop(recipe_id, set())
+            new = current.get(recipe_id, set())
+            for ingredient_id in old - new:
+                posting = self.postings[ingredient_id]
+                del posting[bisect_left(posting, recipe_id)]
+                if not posting:
+                    del self.postings[ingredient_id]
+            for ingredient_id in new - old:
+                insort(self.postings.setdefault(ingredient_id, []), recipe_id)
+            if new:
+                self.ingredients[recipe_id] = new
+
+    def refresh(self):
+        sequence = cache.get(CHANGES_SEQUENCE_KEY, 0)
+        if sequence == self._sequence:
+            return
+        applied = self._sequence
+        if (applied is None or sequence < applied
+                or sequence - applied > MATCHING_MAX_CHANGES):
+            self.rebuild()
+        else:
+            keys = [_change_key(number)
+                    for number in range(applied + 1, sequence + 1)]
+            changes = cache.get_many(keys)
+            if len(changes) != len(keys):
+                self.rebuild()
+            else:
+                self.update({recipe_id for recipe_ids in changes.values()
+                             for recipe_id in recipe_ids})
+        self._sequence = sequence
+
+    def get_postings(self, ingredient_ids):
+        self.refresh()
+        return sorted((self.postings.get(pk, ()) for pk in ingredient_ids),
+                      key=len)
+
+    def match_all(self, ingredient_ids):
+        """Рецепты, в которых есть все ингредиенты."""
+        with self._lock:
+            shortest, *others = self.get_postings(ingredient_ids)
+            recipe_ids = set(shortest)
+            for posting in others:
+                if not recipe_ids:
+                    break
+                recipe_ids.intersection_update(posting)
+        return recipe_ids
+
+    def match_any(self, ingredient_ids):
+        """Рецепты, в которых есть хотя бы один из ингредиентов."""
+        recipe_ids = set()
+        with self._lock:
+            for posting in self.get_postings(ingredient_ids):
+                recipe_ids.update(posting)
+        return recipe_ids
+
+    def get_coverage(self, ingredient_ids):
+        """Доля ингредиентов каждого подходящего рецепта из переданных."""
+        matched = Counter()
+        with self._lock:
+            for posting in self.get_postings(ingredient_ids):
+                matched.update(posting)
+            return {recipe_id: count / len(self.ingredients[recipe_id])
+                    for recipe_id, count in matched.items()}
+
+
+recipe_ingredient_index = RecipeIngredientIndex()
+
+
+def _recipe_ingredients(ingredient_ids):
+    return IngredientRecipe.objects.filter(
+        recipe_id=OuterRef('pk'), ingredient_id__in=ingredient_ids)
+
+
+def filter_all_ingredients(queryset, ingredient_ids):
+    recipe_ids = recipe_ingredient_index.match_all(ingredient_ids)
+    if len(recipe_ids) <= MATCHING_MAX_IDS:
+        return queryset.filter(id__in=recipe_ids)
+    # Слишком длинный список id дороже отдать в SQL, чем полусоединения.
+    for ingredient_id in ingredient_ids:
+        queryset = queryset.filter(
+            Exists(_recipe_ingredients([ingredient_id])))
+    return queryset
+
+
+def exclude_any_ingredients(queryset, ingredient_ids):
+    recipe_ids = recipe_ingredient_index.match_any(ingredient_ids)
+    if len(recipe_ids) <= MATCHING_MAX_IDS:
+        return queryset.exclude(id__in=recipe_ids)
+    return queryset.exclude(Exists(_recipe_ingredients(ingredient_ids)))
+
+
+def annotate_coverage(queryset, ingredient_ids):
+    """Аннотирует долю покрытия, оставляя MATCHING_MAX_IDS лучших рецептов."""
+    coverage = recipe_ingredient_index.get_coverage(ingredient_ids)
+    if not coverage:
+        return queryset.none()
+    best = heapq.nlargest(
+        MATCHING_MAX_IDS, coverage.items(), key=lambda item: item[::-1])
+    ids_by_value = defaultdict(list)
+    for recipe_id, value in best:
+        ids_by_value[round(value, COVERAGE_PRECISION)].append(recipe_id)
+    return queryset.filter(id__in=[pk for pk, _ in best]).annotate(
+        ingredient_coverage=Case(
+            *(When(id__in=ids, then=Value(value))
+              for value, ids in ids_by_value.items()),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ))
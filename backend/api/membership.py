@@ -0,0 +1,56 @@
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db import transaction
+from recipes.models import BuyList, Favorite
+from users.models import Subscription
+
+from .constants import MEMBERSHIP_CACHE_TTL
+
+FAVORITES = 'favorites'
+CART = 'cart'
+SUBSCRIPTIONS = 'subscriptions'
+
+Membership = namedtuple('Membership', (FAVORITES, CART, SUBSCRIPTIONS))
+
+
+def _membership_key(user_id):
+    return f'membership:{user_id}'
+
+
+def _load_membership(user):
+    return Membership(
+        set(Favorite.objects.filter(user=user).values_list(
+            'recipe_id', flat=True)),
+        set(BuyList.objects.filter(user=user).values_list(
+            'recipe_id', flat=True)),
+        set(Subscription.objects.filter(user=user).values_list(
+            'author_id', flat=True)),
+    )
+
+
+def get_membership(request):
+    """Множества id избранного, корзины и подписок текущего пользователя."""
+    if not hasattr(request, 'membership'):
+        user = request.user
+        if not user.is_authenticated:
+            request.membership = Membership(set(), set(), set())
+        else:
+            request.membership = cache.get_or_set(
+                _membership_key(user.pk), lambda: _load_membership(user),
+                MEMBERSHIP_CACHE_TTL)
+    return request.membership
+
+
+def update_membership(request, kind, value, add=True):
+    if hasattr(request, 'membership'):
+        members = getattr(request.membership, kind)
+        if add:
+            members.add(value)
+        else:
+            members.discard(value)
+
+    # Правка множества в кеше через get/set теряет параллельные изменения,
+    # поэтому запись удаляется и перечитывается при следующем запросе.
+    key = _membership_key(request.user.pk)
+    transaction.on_commit(lambda: cache.delete(key))
@@ -0,0 +1,47 @@
+import gzip
+from functools import lru_cache
+
+from django.utils.cache import patch_vary_headers
+
+from .catalog import accepts_gzip
+from .constants import (COMPRESSION_CACHE_SIZE, COMPRESSION_LEVEL,
+                        COMPRESSION_MIN_SIZE)
+
+COMPRESSIBLE_METHODS = ('GET', 'HEAD')
+
+
+@lru_cache(maxsize=COMPRESSION_CACHE_SIZE)
+def compress(content):
+    return gzip.compress(content, COMPRESSION_LEVEL, mtime=0)
+
+
+class JSONCompressionMiddleware:
+    """Сжимает gzip JSON-ответы на GET-запросы больше порога.
+
+    Сжатые байты одинаковых ответов берутся из LRU-кеша процесса.
+    Ответы на POST не сжимаются: в них бывают токены (BREACH).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (request.method not in COMPRESSIBLE_METHODS
+                or response.streaming
+                or response.status_code != 200
+                or response.has_header('Content-Encoding')
+                or not response.get('Content-Type', '').startswith(
+                    'application/json')
+                or len(response.content) < COMPRESSION_MIN_SIZE):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if not accepts_gzip(request):
+            return response
+        response.content = compress(response.content)
+        response['Content-Length'] = str(len(response.content))
+        response['Content-Encoding'] = 'gzip'
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = f'W/{etag}'
+        return response
@@ -1,6 +1,36 @@
+import binascii
+import hashlib
+from base64 import b64decode, b64encode
+
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.db import connection
+from django.utils.functional import cached_property
+from recipes.constants import RECIPES_VERSION, RELATIONS_VERSION, USERS_VERSION
+from recipes.versions import get_version
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .constants import (AUTOCOMPLETE_MAX_PAGE_SIZE, AUTOCOMPLETE_PAGE_SIZE,
+                        COUNT_CACHE_TTL, COUNT_ESTIMATE_THRESHOLD,
+                        MAX_PAGE_SIZE, PAGE_SIZE)
+
+COUNT_VERSIONS = (RECIPES_VERSION, USERS_VERSION, RELATIONS_VERSION)
 
-from .constants import MAX_PAGE_SIZE, PAGE_SIZE
+
+def get_table_estimate(model):
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            [model._meta.db_table])
+        row = cursor.fetchone()
+    if row is None or row[0] < 0:
+        return None
+    return row[0]
 
 
 class CustomPagination(pagination.PageNumberPagination):
@@ -8,3 +38,171 @@ class CustomPagination(pagination.PageNumberPagination):
     page_size_query_param = 'limit'
     page_size = PAGE_SIZE
     max_page_size = MAX_PAGE_SIZE
+
+
+class CachedCountPaginator(Paginator):
+
+    def __init__(self, object_list, per_page, get_count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.get_count = get_count
+
+    @cached_property
+    def count(self):
+        if self.get_count is None:
+            return super().count
+        return self.get_count(self.object_list)
+
+
+class EstimatedPage(Page):
+    """Страница при оценочном count, соседние номера с ним не сверяются."""
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+
+class CachedCountPagination(CustomPagination):
+    """Пагинация с кешируемым, а для больших таблиц — оценочным count."""
+
+    def django_paginator_class(self, object_list, per_page):
+        return CachedCountPaginator(object_list, per_page,
+                                    get_count=self.get_count)
+
+    def get_count_key(self, queryset):
+        params = sorted(
+            (key, value) for key, values in self.request.query_params.lists()
+            if key not in (self.page_query_param, self.page_size_query_param)
+            for value in values)
+        user = self.request.user
+        versions = [get_version(name) for name in COUNT_VERSIONS]
+        raw_key = (f'{self.request.path}|{params}|'
+                   f'{user.pk if user.is_authenticated else ""}|{versions}')
+        digest = hashlib.sha1(raw_key.encode()).hexdigest()
+        return f'count:{queryset.model._meta.label_lower}:{digest}'
+
+    def get_estimate(self, queryset):
+        if queryset.query.where:
+            return None
+        estimate = get_table_estimate(queryset.model)
+        if estimate is None or estimate < COUNT_ESTIMATE_THRESHOLD:
+            return None
+        return estimate
+
+    def get_count(self, queryset):
+        key = self.get_count_key(queryset)
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, COUNT_CACHE_TTL)
+        return count
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.count_exact = True
+        estimate = self.get_estimate(queryset)
+        if estimate is None:
+            return super().paginate_queryset(queryset, request, view)
+        return self.paginate_estimated(queryset, request, estimate)
+
+    def paginate_estimated(self, queryset, request, estimate):
+        """Пагинация без проверки номера страницы по оценке count.
+
+        Наличие следующей страницы определяется по лишней выбранной строке.
+        """
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        self.count_exact = False
+        try:
+            number = int(request.query_params.get(self.page_query_param, 1))
+        except ValueError:
+            number = 0
+        if number < 1:
+            raise NotFound(self.invalid_page_message)
+        offset = (number - 1) * page_size
+        rows = list(queryset[offset:offset + page_size + 1])
+        if not rows and number > 1:
+            raise NotFound(self.invalid_page_message)
+        paginator = CachedCountPaginator(queryset, page_size,
+                                         get_count=lambda _: estimate)
+        self.page = EstimatedPage(rows[:page_size], number, paginator,
+                                  len(rows) > page_size)
+        if self.template is not None:
+            self.display_page_controls = True
+        return list(self.page)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.page.paginator.count,
+            'count_exact': self.count_exact,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+class RecipeCursorPagination(pagination.CursorPagination):
+    page_size_query_param = 'limit'
+    page_size = PAGE_SIZE
+    max_page_size = MAX_PAGE_SIZE
+    ordering = ('-pub_date', '-id')
+
+
+class AutocompletePagination(pagination.BasePagination):
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    page_size = AUTOCOMPLETE_PAGE_SIZE
+    max_page_size = AUTOCOMPLETE_MAX_PAGE_SIZE
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return 0
+        try:
+            offset = int(b64decode(encoded.encode('ascii')).decode('ascii'))
+        except (TypeError, ValueError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if offset < 0:
+            raise NotFound(self.invalid_cursor_message)
+        return offset
+
+    def encode_cursor(self, offset):
+        encoded = b64encode(str(offset).encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param,
+                                   encoded)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        offset = self.decode_cursor(request)
+        page = list(queryset[offset:offset + page_size + 1])
+        self.next_offset = offset + page_size
+        self.has_next = len(page) > page_size
+        return page[:page_size]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.next_offset)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
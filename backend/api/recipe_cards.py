@@ -0,0 +1,76 @@
+from django.core.cache import cache
+from django.db import transaction
+
+from .catalog import tag_registry
+from .constants import RECIPE_CARD_SCHEMA, RECIPE_CARD_TTL
+from .membership import get_membership
+
+RECIPE_CARD_ONLY_FIELDS = ('id', 'pub_date', 'author', 'favorites_count',
+                           'in_carts_count')
+
+
+def get_recipe_card_key(pk):
+    return f'recipe_card:{RECIPE_CARD_SCHEMA}:{pk}'
+
+
+def invalidate_recipe_cards(ids):
+    keys = [get_recipe_card_key(pk) for pk in ids]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def get_recipe_cards(ids, build_cards, cache_missing=True):
+    """Независимые от пользователя представления рецептов по id.
+
+    Отсутствующие в кеше карточки строит build_cards(ids) и, если
+    cache_missing, сохраняет.
+    """
+    keys = {pk: get_recipe_card_key(pk) for pk in ids}
+    cached = cache.get_many(keys.values())
+    cards = {pk: cached[key] for pk, key in keys.items() if key in cached}
+    missing = [pk for pk in ids if pk not in cards]
+    if missing:
+        built = {card['id']: card for card in build_cards(missing)}
+        for card in built.values():
+            if 'tags' in card:
+                card['tags'] = [tag['id'] for tag in card['tags']]
+        if cache_missing:
+            cache.set_many({keys[pk]: card for pk, card in built.items()},
+                           RECIPE_CARD_TTL)
+        cards.update(built)
+    return cards
+
+
+def render_recipe_cards(request, recipes, build_cards, fields=None):
+    """Карточки рецептов с пользовательскими полями.
+
+    Если задан fields, в ответ попадают только эти поля, а недостающие
+    карточки строятся урезанными и не кешируются.
+    """
+    cards = get_recipe_cards([recipe.id for recipe in recipes], build_cards,
+                             cache_missing=fields is None)
+    membership = get_membership(request)
+    data = []
+    for recipe in recipes:
+        item = dict(cards[recipe.id])
+        overlay = {
+            'is_favorited': recipe.id in membership.favorites,
+            'is_in_shopping_cart': recipe.id in membership.cart,
+            'favorites_count': recipe.favorites_count,
+            'in_carts_count': recipe.in_carts_count,
+        }
+        for key, value in overlay.items():
+            if key in item:
+                item[key] = value
+        if 'tags' in item:
+            item['tags'] = tag_registry.get_many(item['tags'])
+        if 'author' in item:
+            item['author'] = {
+                **item['author'],
+                'is_subscribed': recipe.author_id in membership.subscriptions,
+            }
+        if fields is not None:
+            item = {key: value for key, value in item.items()
+                    if key in fields}
+        data.append(item)
+    return data
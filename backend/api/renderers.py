@@ -0,0 +1,35 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+LINE_SEPARATORS = (('\u2028'.encode(), b'\\u2028'),
+                   ('\u2029'.encode(), b'\\u2029'))
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer на orjson с тем же побайтовым результатом.
+
+    Без orjson, с отступами и при нестандартных настройках JSON
+    работает стандартный JSONRenderer. Вещественные числа с модулем
+    меньше 1e-4 или от 1e16 orjson записывает иначе (1e16 вместо 1e+16,
+    0.00001 или 1e-7 вместо 1e-05 и 1e-07). В ответах API есть только
+    ingredient_coverage в [0, 1] с четырьмя знаками, он совпадает.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if (orjson is None or indent is not None or not self.compact
+                or self.ensure_ascii or not self.strict):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        content = orjson.dumps(
+            data, default=self.encoder_class().default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+        for separator, escaped in LINE_SEPARATORS:
+            content = content.replace(separator, escaped)
+        return content
@@ -0,0 +1,41 @@
+import hashlib
+from functools import wraps
+
+from django.core.cache import caches
+from recipes.versions import get_version
+from rest_framework import status
+from rest_framework.response import Response
+
+RESPONSE_CACHE_ALIAS = 'responses'
+
+
+def get_response_cache_key(request, version_names):
+    params = sorted((key, value)
+                    for key, values in request.query_params.lists()
+                    for value in values)
+    versions = [get_version(name) for name in version_names]
+    raw_key = f'{request.build_absolute_uri(request.path)}|{params}|{versions}'
+    return f'response:{hashlib.sha1(raw_key.encode()).hexdigest()}'
+
+
+def cache_anonymous_response(*version_names):
+    """Кеширует ответ для анонимных пользователей до смены версий данных."""
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            if request.user.is_authenticated:
+                return method(self, request, *args, **kwargs)
+            cache = caches[RESPONSE_CACHE_ALIAS]
+            key = get_response_cache_key(request, version_names)
+            data = cache.get(key)
+            if data is not None:
+                return Response(data)
+            response = method(self, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                cache.set(key, response.data)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,177 @@
+import bisect
+from collections import namedtuple
+
+from django.contrib.postgres.search import (SearchHeadline, SearchQuery,
+                                            SearchRank, TrigramWordSimilarity)
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import (Case, Count, F, FloatField, IntegerField, Q,
+                              Value, When)
+from django.utils.html import escape
+from recipes.constants import CATALOG_VERSION, RECIPE_SEARCH_CONFIG
+from recipes.models import Ingredient, IngredientRecipe, Recipe
+from recipes.utils import WORD_RE, get_search_tokens, normalize_search_name
+from recipes.versions import VersionedState
+
+from .constants import (INGREDIENT_USAGE_TTL, RECIPE_SNIPPET_WORDS,
+                        SEARCH_RESULTS_LIMIT, SNIPPET_START, SNIPPET_STOP,
+                        TRIGRAM_SIMILARITY_THRESHOLD)
+
+PREFIX_RANK = 0
+SUBSTRING_RANK = 1
+SIMILARITY_RANK = 2
+
+HEADLINE_START = '\x02'
+HEADLINE_STOP = '\x03'
+
+IndexState = namedtuple('IndexState', ('keys', 'ids', 'entries', 'trigrams'))
+
+
+def get_trigrams(value):
+    trigrams = set()
+    for word in WORD_RE.findall(normalize_search_name(value)):
+        padded = f'  {word} '
+        trigrams.update(
+            padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(trigrams)
+
+
+def get_word_similarity(query_trigrams, trigrams):
+    if not query_trigrams:
+        return 0.0
+    return len(query_trigrams & trigrams) / len(query_trigrams)
+
+
+class IngredientPrefixIndex(VersionedState):
+    """Отсортированный индекс названий ингредиентов в памяти процесса."""
+
+    version_name = CATALOG_VERSION
+
+    def build(self, version):
+        rows = Ingredient.objects.order_by('id').values_list(
+            'id', 'name', 'measurement_unit', 'search_name')
+        entries = {}
+        trigrams = {}
+        keys = []
+        for pk, name, measurement_unit, search_name in rows:
+            entries[pk] = {'id': pk, 'name': name,
+                           'measurement_unit': measurement_unit}
+            trigrams[pk] = get_trigrams(name)
+            keys.append((search_name, pk))
+        keys.sort()
+        return IndexState([key for key, _ in keys], [pk for _, pk in keys],
+                          entries, trigrams)
+
+    def search(self, prefix):
+        state = self.get_state()
+        prefix = normalize_search_name(prefix)
+        start = bisect.bisect_left(state.keys, prefix)
+        end = bisect.bisect_left(state.keys, prefix + '\U0010ffff', lo=start)
+        return [state.entries[pk] for pk in sorted(state.ids[start:end])]
+
+    def ranked_search(self, query, limit=SEARCH_RESULTS_LIMIT, usage=None):
+        state = self.get_state()
+        query = normalize_search_name(query)
+        query_trigrams = get_trigrams(query)
+        ranked = []
+        for key, pk in zip(state.keys, state.ids):
+            similarity = get_word_similarity(query_trigrams,
+                                             state.trigrams[pk])
+            if key.startswith(query):
+                rank = PREFIX_RANK
+            elif query in key:
+                rank = SUBSTRING_RANK
+            elif similarity >= TRIGRAM_SIMILARITY_THRESHOLD:
+                rank = SIMILARITY_RANK
+            else:
+                continue
+            popularity = usage.get(pk, 0) if usage else 0
+            ranked.append((rank, -popularity, -similarity, key, pk))
+        ranked.sort()
+        return [state.entries[pk] for *_, pk in ranked[:limit]]
+
+
+ingredient_index = IngredientPrefixIndex()
+
+
+def _count_ingredient_usage():
+    return dict(
+        IngredientRecipe.objects.order_by().values('ingredient')
+        .annotate(count=Count('id')).values_list('ingredient', 'count'))
+
+
+def get_ingredient_usage():
+    return cache.get_or_set('ingredient_usage', _count_ingredient_usage,
+                            INGREDIENT_USAGE_TTL)
+
+
+def ranked_ingredient_search(query, limit=SEARCH_RESULTS_LIMIT):
+    if connection.vendor != 'postgresql':
+        return ingredient_index.ranked_search(query, limit)
+    search_name = normalize_search_name(query)
+    queryset = Ingredient.objects.filter(
+        Q(search_name__contains=search_name)
+        | Q(name__trigram_word_similar=query)
+    ).annotate(
+        rank=Case(
+            When(search_name__startswith=search_name,
+                 then=Value(PREFIX_RANK)),
+            When(search_name__contains=search_name,
+                 then=Value(SUBSTRING_RANK)),
+            default=Value(SIMILARITY_RANK),
+            output_field=IntegerField(),
+        ),
+        similarity=TrigramWordSimilarity(query, 'name'),
+    ).order_by('rank', '-similarity', 'name')
+    return list(queryset.values('id', 'name', 'measurement_unit')[:limit])
+
+
+def get_recipe_search_query(value):
+    return SearchQuery(value, config=RECIPE_SEARCH_CONFIG,
+                       search_type='websearch')
+
+
+def search_recipes(queryset, value):
+    """Полнотекстовый поиск рецептов с аннотацией search_rank."""
+    if connection.vendor == 'postgresql':
+        query = get_recipe_search_query(value)
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query))
+    tokens = get_search_tokens(value)
+    if not tokens:
+        return queryset.none()
+    for token in tokens:
+        queryset = queryset.filter(search_vector__contains=token)
+    return queryset.annotate(
+        search_rank=Value(0.0, output_field=FloatField()))
+
+
+def get_text_snippet(text, tokens, size=RECIPE_SNIPPET_WORDS):
+    words = text.split()
+    marked = [any(token in normalize_search_name(word) for token in tokens)
+              for word in words]
+    start = max(marked.index(True) - size // 2, 0) if any(marked) else 0
+    return ' '.join(
+        f'{SNIPPET_START}{escape(word)}{SNIPPET_STOP}' if is_marked
+        else escape(word)
+        for word, is_marked in zip(words[start:start + size],
+                                   marked[start:start + size]))
+
+
+def get_recipe_snippets(ids, value):
+    """Фрагменты описаний рецептов с подсвеченными словами запроса."""
+    recipes = Recipe.objects.filter(id__in=ids)
+    if connection.vendor == 'postgresql':
+        # ts_headline не экранирует текст: подсветка ставится служебными
+        # символами и превращается в теги после экранирования.
+        snippets = recipes.annotate(snippet=SearchHeadline(
+            'text', get_recipe_search_query(value),
+            config=RECIPE_SEARCH_CONFIG, start_sel=HEADLINE_START,
+            stop_sel=HEADLINE_STOP, max_words=RECIPE_SNIPPET_WORDS,
+        )).values_list('id', 'snippet')
+        return {pk: escape(snippet).replace(HEADLINE_START, SNIPPET_START)
+                .replace(HEADLINE_STOP, SNIPPET_STOP)
+                for pk, snippet in snippets}
+    tokens = get_search_tokens(value)
+    return {pk: get_text_snippet(text, tokens)
+            for pk, text in recipes.values_list('id', 'text')}
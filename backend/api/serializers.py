@@ -3,35 +3,122 @@ import binascii
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import TemporaryUploadedFile
 from django.db import transaction
 from djoser.serializers import UserCreateSerializer, UserSerializer
+from PIL import Image
+from recipes.constants import RECIPES_VERSION
 from recipes.models import (BuyList, Favorite, Ingredient, IngredientRecipe,
                             Recipe, Tag)
+from recipes.renditions import get_rendition_urls
+from recipes.versions import bump_version
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 from rest_framework.generics import get_object_or_404
 from users.models import Subscription
 
+from .catalog import tag_registry
+from .constants import (BASE64_CHUNK_SIZE, BASE64_HEADER_MAX_LEN,
+                        IMAGE_MAX_SIDE, IMAGE_MAX_SIZE)
+from .matching import mark_recipes_changed
+from .membership import get_membership
+from .recipe_cards import invalidate_recipe_cards
+from .utils import change_recipe_counter
 from .validators import validate_unique_for_list
 
 User = get_user_model()
 
 
 class Base64ImageField(serializers.ImageField):
+    """Изображение из data URI или multipart-файла.
+
+    Base64 декодируется частями во временный файл на диске, размер и
+    габариты проверяются до полной загрузки изображения.
+    """
+
+    default_error_messages = {
+        'too_large': 'Размер изображения превышает {max_size} байт.',
+        'too_big': 'Стороны изображения не должны превышать {max_side} px.',
+    }
+
+    def decode_base64(self, data):
+        header, separator, _ = data[:BASE64_HEADER_MAX_LEN].partition(
+            ';base64,')
+        if not separator:
+            raise serializers.ValidationError('Invalid base64 format')
+        start = len(header) + len(separator)
+        size = (len(data) - start) * 3 // 4 - data[-2:].count('=')
+        if size > IMAGE_MAX_SIZE:
+            self.fail('too_large', max_size=IMAGE_MAX_SIZE)
+        image_extension = header.split('/')[-1]
+        file = TemporaryUploadedFile(f'image.{image_extension}',
+                                     header[len('data:'):], size, None)
+        try:
+            for offset in range(start, len(data), BASE64_CHUNK_SIZE):
+                file.write(base64.b64decode(
+                    data[offset:offset + BASE64_CHUNK_SIZE], validate=True))
+        except (ValueError, binascii.Error):
+            file.close()
+            raise serializers.ValidationError('Invalid base64 format')
+        file.seek(0)
+        return file
+
+    def check_image(self, file):
+        if file.size > IMAGE_MAX_SIZE:
+            self.fail('too_large', max_size=IMAGE_MAX_SIZE)
+        try:
+            with Image.open(file) as image:
+                width, height = image.size
+        except (OSError, ValueError, Image.DecompressionBombError):
+            self.fail('invalid_image')
+        finally:
+            file.seek(0)
+        if max(width, height) > IMAGE_MAX_SIDE:
+            self.fail('too_big', max_side=IMAGE_MAX_SIDE)
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            try:
-                image_type, image_data = data.split(';base64,')
-                image_extension = image_type.split('/')[-1]
-                decoded_image = base64.b64decode(image_data)
-                file_name = f'image.{image_extension}'
-                data = ContentFile(decoded_image, name=file_name)
-            except (ValueError, TypeError, binascii.Error):
-                raise serializers.ValidationError('Invalid base64 format')
+            data = self.decode_base64(data)
+        if hasattr(data, 'size') and hasattr(data, 'seek'):
+            self.check_image(data)
         return super().to_internal_value(data)
 
 
+class ImageRenditionsField(serializers.Field):
+    """Ссылки на уменьшенные копии изображения рецепта."""
+
+    def __init__(self, **kwargs):
+        kwargs.update(source='*', read_only=True)
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return get_rendition_urls(value)
+
+
+class BatchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Проверяет только формат pk; объекты загружаются пачкой in_bulk."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+    def in_bulk(self, pks):
+        return self.get_queryset().in_bulk(set(pks))
+
+
+def resolve_pks(field, pks, message):
+    objects = field.in_bulk(pks)
+    missing = sorted(set(pks) - set(objects))
+    if missing:
+        raise ValidationError(
+            f'{message}: {", ".join(map(str, missing))}.')
+    return objects
+
+
 class CustomUserSerializer(UserSerializer):
     is_subscribed = serializers.SerializerMethodField()
 
@@ -41,16 +128,14 @@ class CustomUserSerializer(UserSerializer):
                   'is_subscribed')
 
     def get_is_subscribed(self, obj):
-        user = self.context['request'].user
-        return (user.is_authenticated and obj.subscribed.filter(
-            user=user).exists())
+        return obj.id in get_membership(self.context['request']).subscriptions
 
 
 class IngredientsSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Ingredient
-        fields = '__all__'
+        fields = ('id', 'name', 'measurement_unit')
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -61,7 +146,7 @@ class TagSerializer(serializers.ModelSerializer):
 
 
 class RecipeIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
+    id = BatchedPrimaryKeyRelatedField(
         queryset=Ingredient.objects.all(), source='ingredient')
     name = serializers.ReadOnlyField(source='ingredient.name')
     measurement_unit = serializers.ReadOnlyField(
@@ -80,20 +165,59 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
 
 class RecipeSerializer(serializers.ModelSerializer):
     image = Base64ImageField()
-    tags = serializers.PrimaryKeyRelatedField(
+    image_renditions = ImageRenditionsField()
+    tags = BatchedPrimaryKeyRelatedField(
         many=True, queryset=Tag.objects.all(), source='tag')
     author = CustomUserSerializer(read_only=True)
     ingredients = RecipeIngredientSerializer(
         many=True, source='recipe_ingredients')
-    is_favorited = serializers.BooleanField(read_only=True, default=False)
-    is_in_shopping_cart = serializers.BooleanField(read_only=True,
-                                                   default=False)
+    is_favorited = serializers.SerializerMethodField()
+    is_in_shopping_cart = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image', 'text',
-                  'cooking_time')
+                  'is_in_shopping_cart', 'name', 'image', 'image_renditions',
+                  'text', 'cooking_time', 'favorites_count',
+                  'in_carts_count')
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
+    def get_is_favorited(self, obj):
+        return obj.id in get_membership(self.context['request']).favorites
+
+    def get_is_in_shopping_cart(self, obj):
+        return obj.id in get_membership(self.context['request']).cart
+
+    def to_internal_value(self, data):
+        attrs = super().to_internal_value(data)
+        errors = {}
+        if 'tag' in attrs:
+            try:
+                tags = resolve_pks(self.fields['tags'].child_relation,
+                                   attrs['tag'], 'Не найдены теги с id')
+                attrs['tag'] = [tags[pk] for pk in attrs['tag']]
+            except ValidationError as error:
+                errors['tags'] = error.detail
+        if 'recipe_ingredients' in attrs:
+            items = attrs['recipe_ingredients']
+            try:
+                ingredients = resolve_pks(
+                    self.fields['ingredients'].child.fields['id'],
+                    [item['ingredient'] for item in items],
+                    'Не найдены ингредиенты с id')
+                for item in items:
+                    item['ingredient'] = ingredients[item['ingredient']]
+            except ValidationError as error:
+                errors['ingredients'] = error.detail
+        if errors:
+            raise ValidationError(errors)
+        return attrs
 
     def _create_ingredients(self, recipe, ingredients_data):
         ingredients = [
@@ -113,19 +237,63 @@ class RecipeSerializer(serializers.ModelSerializer):
         recipe.tag.set(tags)
         return recipe
 
+    def _update_ingredients(self, recipe, ingredients_data):
+        stored = {item.ingredient_id: item
+                  for item in recipe.recipe_ingredients.all()}
+        submitted = {data['ingredient'].id: data['amount']
+                     for data in ingredients_data}
+        removed = [item.id for ingredient_id, item in stored.items()
+                   if ingredient_id not in submitted]
+        changed = []
+        created = []
+        for ingredient_id, amount in submitted.items():
+            item = stored.get(ingredient_id)
+            if item is None:
+                created.append(IngredientRecipe(
+                    recipe=recipe, ingredient_id=ingredient_id, amount=amount))
+            elif item.amount != amount:
+                item.amount = amount
+                changed.append(item)
+        if removed:
+            IngredientRecipe.objects.filter(id__in=removed).delete()
+        if changed:
+            IngredientRecipe.objects.bulk_update(changed, ('amount',))
+        if created:
+            IngredientRecipe.objects.bulk_create(created)
+        return len(removed) + len(changed) + len(created)
+
     @transaction.atomic
     def update(self, instance, validated_data):
-        tags = validated_data.pop('tag', [])
-        ingredients_data = validated_data.pop('recipe_ingredients', [])
-        instance.name = validated_data.get('name', instance.name)
-        instance.text = validated_data.get('text', instance.text)
-        instance.cooking_time = validated_data.get('cooking_time',
-                                                   instance.cooking_time)
-        instance.image = validated_data.get('image', instance.image)
-        instance.save()
-        instance.tag.set(tags)
-        instance.recipe_ingredients.all().delete()
-        self._create_ingredients(instance, ingredients_data)
+        """Пишет только изменившиеся поля, теги и ингредиенты.
+
+        Число затронутых строк сохраняется в self.rows_touched.
+        """
+        tags = validated_data.pop('tag', None)
+        ingredients_data = validated_data.pop('recipe_ingredients', None)
+        rows_touched = 0
+        update_fields = [
+            field for field, value in validated_data.items()
+            if field == 'image' or getattr(instance, field) != value]
+        if update_fields:
+            for field in update_fields:
+                setattr(instance, field, validated_data[field])
+            instance.save(update_fields=update_fields)
+            rows_touched += 1
+        if tags is not None:
+            changed_tags = ({tag.id for tag in tags}
+                            ^ {tag.id for tag in instance.tag.all()})
+            if changed_tags:
+                instance.tag.set(tags)
+                rows_touched += len(changed_tags)
+        if ingredients_data is not None:
+            changed_ingredients = self._update_ingredients(
+                instance, ingredients_data)
+            if changed_ingredients:
+                bump_version(RECIPES_VERSION)
+                invalidate_recipe_cards([instance.pk])
+                mark_recipes_changed([instance.pk])
+                rows_touched += changed_ingredients
+        self.rows_touched = rows_touched
         return instance
 
     def validate(self, attrs):
@@ -158,18 +326,21 @@ class RecipeSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
 
         representation = super().to_representation(instance)
-        tags = instance.tag.all()
-        representation['tags'] = TagSerializer(tags, many=True).data
-        media_url = settings.MEDIA_URL
-        representation['image'] = media_url + str(instance.image)
+        if 'tags' in representation:
+            representation['tags'] = tag_registry.get_many(
+                representation['tags'])
+        if 'image' in representation:
+            media_url = settings.MEDIA_URL
+            representation['image'] = media_url + str(instance.image)
         return representation
 
 
 class RepresentBaseRecipeSerializer(serializers.ModelSerializer):
+    image_renditions = ImageRenditionsField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_renditions', 'cooking_time')
         read_only_fields = ('id', 'name', 'image', 'cooking_time')
 
 
@@ -189,12 +360,14 @@ class BaseAddRecipeSerializer(serializers.ModelSerializer):
                 f'Вы уже добавили этот рецепт в {model._meta.verbose_name}.')
         return super().validate(attrs)
 
+    @transaction.atomic
     def create(self, validated_data):
         model = self.Meta.model
         user = self.context['request'].user
         recipe_id = self.context['recipe_id']
         recipe = get_object_or_404(Recipe, id=recipe_id)
         instanse = model.objects.create(user=user, recipe=recipe)
+        change_recipe_counter(recipe.id, model.counter_field, 1)
         return instanse
 
     def to_representation(self, instance):
@@ -222,10 +395,11 @@ class CustomUserCreateSerializer(UserCreateSerializer):
 
 
 class RecipeRepresentateForSubcribe(serializers.ModelSerializer):
+    image_renditions = ImageRenditionsField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_renditions', 'cooking_time')
 
 
 class SubscriptionSerializer(serializers.ModelSerializer):
@@ -243,8 +417,7 @@ class SubscriptionSerializer(serializers.ModelSerializer):
                             'recipes_count')
 
     def get_is_subscribed(self, obj):
-        user = self.context['request'].user
-        return obj.subscribed.filter(user=user).exists()
+        return obj.id in get_membership(self.context['request']).subscriptions
 
     def get_recipes(self, obj):
         recipes_limit = self.context.get('recipes_limit')
@@ -0,0 +1,112 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from recipes.constants import (CATALOG_VERSION, RECIPES_VERSION,
+                               RELATIONS_VERSION, USERS_VERSION)
+from recipes.models import (BuyList, Favorite, Ingredient, IngredientRecipe,
+                            Recipe, Tag)
+from recipes.renditions import schedule_renditions
+from recipes.versions import bump_version
+from users.models import Subscription
+
+from .matching import mark_recipes_changed
+from .recipe_cards import invalidate_recipe_cards
+
+User = get_user_model()
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Tag)
+def bump_catalog_version(sender, **kwargs):
+    bump_version(CATALOG_VERSION)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=IngredientRecipe)
+def bump_recipes_version(sender, **kwargs):
+    bump_version(RECIPES_VERSION)
+
+
+@receiver(post_save, sender=Recipe)
+def mark_recipe_created(sender, instance, created, **kwargs):
+    # Ингредиенты нового рецепта пишутся bulk_create без сигналов.
+    if created:
+        mark_recipes_changed([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def mark_recipe_deleted(sender, instance, **kwargs):
+    mark_recipes_changed([instance.pk])
+
+
+@receiver((post_save, post_delete), sender=IngredientRecipe)
+def mark_recipe_ingredients_changed(sender, instance, **kwargs):
+    mark_recipes_changed([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tag.through)
+def bump_recipes_version_on_tags(sender, action, **kwargs):
+    if action.startswith('post_'):
+        bump_version(RECIPES_VERSION)
+
+
+def is_last_login_update(update_fields):
+    return update_fields is not None and set(update_fields) == {'last_login'}
+
+
+@receiver((post_save, post_delete), sender=User)
+def bump_users_version(sender, update_fields=None, **kwargs):
+    if not is_last_login_update(update_fields):
+        bump_version(USERS_VERSION)
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=BuyList)
+@receiver((post_save, post_delete), sender=Subscription)
+def bump_relations_version(sender, **kwargs):
+    bump_version(RELATIONS_VERSION)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipe_card(sender, instance, **kwargs):
+    invalidate_recipe_cards([instance.pk])
+
+
+@receiver((post_save, post_delete), sender=IngredientRecipe)
+def invalidate_recipe_card_on_ingredients(sender, instance, **kwargs):
+    invalidate_recipe_cards([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tag.through)
+def invalidate_recipe_cards_on_tags(sender, instance, action, reverse,
+                                    pk_set, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            invalidate_recipe_cards([instance.pk])
+    elif action == 'pre_clear':
+        invalidate_recipe_cards(
+            list(instance.recipes.values_list('id', flat=True)))
+    elif action in ('post_add', 'post_remove'):
+        invalidate_recipe_cards(pk_set)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipe_cards(sender, instance, created, update_fields,
+                                   **kwargs):
+    if created or is_last_login_update(update_fields):
+        return
+    invalidate_recipe_cards(
+        list(instance.recipes.values_list('id', flat=True)))
+
+
+@receiver(post_save, sender=Ingredient)
+def invalidate_ingredient_recipe_cards(sender, instance, **kwargs):
+    invalidate_recipe_cards(list(
+        IngredientRecipe.objects.filter(ingredient=instance)
+        .values_list('recipe_id', flat=True)))
+
+
+@receiver(post_save, sender=Recipe)
+def render_recipe_image(sender, instance, created, update_fields, **kwargs):
+    if created or update_fields is None or 'image' in update_fields:
+        schedule_renditions(instance.image.name)
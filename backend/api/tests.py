@@ -0,0 +1,15 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+
+class QueryBudgetTest(TestCase):
+
+    def test_get_endpoints_fit_query_budgets(self):
+        output = StringIO()
+        try:
+            call_command('check_query_budgets', stdout=output)
+        except CommandError as error:
+            self.fail(f'{output.getvalue()}{error}')
@@ -1,5 +1,6 @@
-from django.db.models import Sum
-from recipes.models import IngredientRecipe
+from django.db.models import F, Sum, Value
+from django.db.models.functions import Greatest
+from recipes.models import IngredientRecipe, Recipe
 
 
 def get_ingredients_for_download(user) -> str:
@@ -16,3 +17,8 @@ def get_ingredients_for_download(user) -> str:
         ingredient_list.append(line)
     response_content = '\n'.join(ingredient_list)
     return response_content
+
+
+def change_recipe_counter(recipe_id, field, delta):
+    Recipe.objects.filter(pk=recipe_id).update(
+        **{field: Greatest(F(field) + delta, Value(0))})
@@ -1,76 +1,197 @@
+import logging
+
 from django.contrib.auth import get_user_model
-from django.db.models import Exists, OuterRef
+from django.db import transaction
+from django.db.models import Prefetch
 from django.http import HttpResponse
+from django.utils.functional import cached_property
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
-from recipes.models import BuyList, Favorite, Ingredient, Recipe, Tag
+from recipes.constants import CATALOG_VERSION, RECIPES_VERSION, USERS_VERSION
+from recipes.models import (BuyList, Favorite, Ingredient, IngredientRecipe,
+                            Recipe, Tag)
+from recipes.versions import get_version
 from rest_framework import mixins, permissions, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.filters import OrderingFilter
+from rest_framework.exceptions import NotFound
 from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from users.models import Subscription
 
-from .filters import CustomFilterBackend, IngredientsSearch, RecipeFilter
+from .budgets import query_budget
+from .catalog import (conditional_response, get_catalog_etag,
+                      ingredient_snapshot, tag_registry, tag_snapshot)
+from .constants import RECIPE_COMPACT_FIELDS
+from .filters import (CustomFilterBackend, IngredientsSearch, RecipeFilter,
+                      RecipeOrderingFilter)
+from .membership import (CART, FAVORITES, SUBSCRIPTIONS, get_membership,
+                         update_membership)
+from .paginators import AutocompletePagination, RecipeCursorPagination
 from .permissions import IsAuthorOrReadOnly
+from .recipe_cards import RECIPE_CARD_ONLY_FIELDS, render_recipe_cards
+from .response_cache import cache_anonymous_response
+from .search import (get_ingredient_usage, get_recipe_snippets,
+                     ingredient_index, ranked_ingredient_search)
 from .serializers import (BuyListSerializer, CustomUserCreateSerializer,
                           CustomUserSerializer, FavoriteSerializer,
                           IngredientsSerializer, RecipeSerializer,
                           SubscriptionSerializer, TagSerializer)
-from .utils import get_ingredients_for_download
+from .utils import change_recipe_counter, get_ingredients_for_download
 
 User = get_user_model()
 
+logger = logging.getLogger(__name__)
+
 
+@query_budget(list=1, retrieve=1)
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientsSerializer
     filter_backends = (IngredientsSearch, )
     pagination_class = None
-
-
+    autocomplete_pagination_class = AutocompletePagination
+
+    def list(self, request, *args, **kwargs):
+        search_query = request.query_params.get('name')
+        if not search_query:
+            return ingredient_snapshot.response(request)
+        if request.query_params.get('mode') == 'autocomplete':
+            return self.autocomplete(request, search_query)
+        etag = get_catalog_etag(request, get_version(CATALOG_VERSION))
+        if request.query_params.get('mode') == 'ranked':
+            search = ranked_ingredient_search
+        else:
+            search = ingredient_index.search
+        return conditional_response(
+            request, etag, lambda: Response(search(search_query)))
+
+    def autocomplete(self, request, search_query):
+        results = ingredient_index.ranked_search(
+            search_query, limit=None, usage=get_ingredient_usage())
+        paginator = self.autocomplete_pagination_class()
+        page = paginator.paginate_queryset(results, request, view=self)
+        return paginator.get_paginated_response(page)
+
+
+@query_budget(list=1, retrieve=1)
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
+    lookup_value_regex = r'\d+'
+
+    def list(self, request, *args, **kwargs):
+        return tag_snapshot.response(request)
+
+    def retrieve(self, request, *args, **kwargs):
+        tag = tag_registry.get(int(kwargs['pk']))
+        if tag is None:
+            raise NotFound
+        return Response(tag)
 
 
+@query_budget(list=10, retrieve=8)
 class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.select_related('author').prefetch_related(
-        'tag', 'ingredient').all()
+        Prefetch('tag', queryset=Tag.objects.only('id')),
+        Prefetch('recipe_ingredients',
+                 queryset=IngredientRecipe.objects.select_related(
+                     'ingredient'))).defer('search_vector')
     serializer_class = RecipeSerializer
     permission_classes = (IsAuthorOrReadOnly,)
-    filter_backends = (DjangoFilterBackend, OrderingFilter,
+    filter_backends = (DjangoFilterBackend, RecipeOrderingFilter,
                        CustomFilterBackend)
     filterset_class = RecipeFilter
-    ordering_fields = ('pub_date')
-    ordering = ('-pub_date',)
-
-    def get_queryset(self):
-        if not self.request.user.is_authenticated:
-            return super().get_queryset()
-
-        queryset = super().get_queryset().annotate(
-            is_favorited=Exists(
-                Favorite.objects.filter(
-                    user=self.request.user,
-                    recipe_id=OuterRef('pk')
-                )
-            ),
-            is_in_shopping_cart=Exists(
-                BuyList.objects.filter(
-                    user=self.request.user,
-                    recipe_id=OuterRef('pk')
-                )
-            )
-        )
-        return queryset
+    ordering_fields = ('pub_date', 'favorites_count', 'in_carts_count')
+    ordering = ('-pub_date', '-id')
+    cursor_pagination_class = RecipeCursorPagination
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if self.request.query_params.get('pagination') == 'cursor':
+                self._paginator = self.cursor_pagination_class()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    @cached_property
+    def requested_fields(self):
+        all_fields = self.serializer_class.Meta.fields
+        params = self.request.query_params
+        if params.get('view') == 'compact':
+            fields = set(RECIPE_COMPACT_FIELDS)
+        elif params.get('fields'):
+            fields = set(params['fields'].split(','))
+        else:
+            fields = set(all_fields)
+        if params.get('omit'):
+            fields -= set(params['omit'].split(','))
+        if fields >= set(all_fields):
+            return None
+        return tuple(field for field in all_fields if field in fields)
+
+    def build_cards(self, ids):
+        recipes = self.get_queryset().filter(id__in=ids)
+        fields = self.requested_fields
+        if fields is None:
+            return self.get_serializer(recipes, many=True).data
+        recipes = recipes.select_related(None).prefetch_related(None)
+        if 'author' in fields:
+            recipes = recipes.select_related('author')
+        if 'tags' in fields:
+            recipes = recipes.prefetch_related(
+                Prefetch('tag', queryset=Tag.objects.only('id')))
+        if 'ingredients' in fields:
+            recipes = recipes.prefetch_related(
+                Prefetch('recipe_ingredients',
+                         queryset=IngredientRecipe.objects.select_related(
+                             'ingredient')))
+        if 'text' not in fields:
+            recipes = recipes.defer('text')
+        # id нужен для сборки карточек, лишний убирает render_recipe_cards.
+        return self.get_serializer(
+            recipes, many=True, fields=('id', *fields)).data
+
+    def render_recipes(self, recipes):
+        data = render_recipe_cards(self.request, recipes, self.build_cards,
+                                   self.requested_fields)
+        search = self.request.query_params.get('search')
+        if search:
+            snippets = get_recipe_snippets(
+                [recipe.id for recipe in recipes], search)
+            for recipe, item in zip(recipes, data):
+                item['search_snippet'] = snippets.get(recipe.id, '')
+        for recipe, item in zip(recipes, data):
+            if hasattr(recipe, 'ingredient_coverage'):
+                item['ingredient_coverage'] = recipe.ingredient_coverage
+        return data
+
+    @cache_anonymous_response(RECIPES_VERSION, USERS_VERSION,
+                              CATALOG_VERSION)
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(
+            Recipe.objects.only(*RECIPE_CARD_ONLY_FIELDS))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.render_recipes(page))
+        return Response(self.render_recipes(list(queryset)))
+
+    def retrieve(self, request, *args, **kwargs):
+        recipe = get_object_or_404(
+            Recipe.objects.only(*RECIPE_CARD_ONLY_FIELDS), pk=kwargs['pk'])
+        return Response(self.render_recipes([recipe])[0])
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def perform_update(self, serializer):
+        recipe = serializer.save()
+        logger.info('Рецепт %s обновлён, затронуто строк: %s',
+                    recipe.pk, serializer.rows_touched)
+
 
 class BaseAddRecipeViewSet(mixins.CreateModelMixin, mixins.DestroyModelMixin,
                            viewsets.GenericViewSet):
@@ -84,11 +205,20 @@ class BaseAddRecipeViewSet(mixins.CreateModelMixin, mixins.DestroyModelMixin,
         context['recipe_id'] = self.kwargs.get('recipe_id')
         return context
 
+    def perform_create(self, serializer):
+        instance = serializer.save()
+        update_membership(self.request, self.membership_kind,
+                          instance.recipe_id)
+
+    @transaction.atomic
     def destroy(self, request, recipe_id):
         user = request.user
         recipe = get_object_or_404(Recipe, id=recipe_id)
         instance = get_object_or_404(self.queryset, user=user, recipe=recipe)
         instance.delete()
+        change_recipe_counter(recipe.id, instance.counter_field, -1)
+        update_membership(request, self.membership_kind, recipe.id,
+                          add=False)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -96,14 +226,17 @@ class FavoriteViewSet(BaseAddRecipeViewSet):
 
     queryset = Favorite.objects.all()
     serializer_class = FavoriteSerializer
+    membership_kind = FAVORITES
 
 
 class BuyListViewSet(BaseAddRecipeViewSet):
 
     queryset = BuyList.objects.all()
     serializer_class = BuyListSerializer
+    membership_kind = CART
 
 
+@query_budget(get=1)
 class DownloadShoppingCart(APIView):
 
     permission_classes = (IsAuthenticated,)
@@ -117,6 +250,7 @@ class DownloadShoppingCart(APIView):
         return response
 
 
+@query_budget(list=6, retrieve=4, me=3)
 class CustomUserViewSet(UserViewSet):
 
     serializer_class = CustomUserSerializer
@@ -137,6 +271,7 @@ class CustomUserViewSet(UserViewSet):
         return Response(serializer.data)
 
 
+@query_budget(list=6)
 class SubscriptionViewSet(mixins.ListModelMixin, mixins.CreateModelMixin,
                           mixins.DestroyModelMixin, viewsets.GenericViewSet):
 
@@ -144,7 +279,7 @@ class SubscriptionViewSet(mixins.ListModelMixin, mixins.CreateModelMixin,
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_queryset(self):
-        authors = self.request.user.subscribers.values('author').all()
+        authors = get_membership(self.request).subscriptions
         return User.objects.filter(id__in=authors).prefetch_related('recipes')
 
     def get_serializer_context(self):
@@ -161,10 +296,12 @@ class SubscriptionViewSet(mixins.ListModelMixin, mixins.CreateModelMixin,
         user = self.get_serializer_context().get('user')
         author = self.get_serializer_context().get('author')
         serializer.save(user=user, author=author)
+        update_membership(self.request, SUBSCRIPTIONS, author.id)
 
     def destroy(self, request, author_id):
         author = get_object_or_404(User, id=author_id)
         instance = get_object_or_404(Subscription, user=self.request.user,
                                      author=author)
         instance.delete()
+        update_membership(request, SUBSCRIPTIONS, author.id, add=False)
         return Response(status=status.HTTP_204_NO_CONTENT)
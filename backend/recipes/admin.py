@@ -29,10 +29,10 @@ class AdminRecipe(admin.ModelAdmin):
     inlines = [AdminIngredientRecipeInline]
     list_display = ('id', 'name', 'author')
     list_filter = ('name', 'author', 'tag')
-    readonly_fields = ('id', 'total_favorite_count',)
+    readonly_fields = ('id', 'total_favorite_count', 'in_carts_count')
 
     def total_favorite_count(self, obj):
-        return obj.favorite_set.count()
+        return obj.favorites_count
 
     total_favorite_count.short_description = ('Количество добавлений'
                                               ' в избранное')
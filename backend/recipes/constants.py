@@ -3,8 +3,27 @@ RECIPE_NAME_MAX_LEN = 200
 RECIPE_TEXT_MAX_LEN = 5000
 MEASUREMENT_UNIT_MAX_LEN = 20
 HEX_COLOR_MAX_LEN = 7
+IMAGE_NAME_MAX_LEN = 100
 MAX_COOKING_TIME = 1000
 MIN_COOKING_TIME = 1
 MAX_AMOUNT_INGREDIENT = 3000
 MIN_AMOUNT_INGREDIENT = 1
 STR_REPR_LEN = 20
+CATALOG_VERSION = 'catalog'
+IMPORT_BATCH_SIZE = 1000
+IMPORT_READ_SIZE = 64 * 1024
+RECIPES_VERSION = 'recipes'
+USERS_VERSION = 'users'
+RELATIONS_VERSION = 'relations'
+RECONCILE_BATCH_SIZE = 1000
+RECIPE_SEARCH_CONFIG = 'russian'
+RECIPE_IMAGE_RENDITIONS = {
+    'thumbnail': (160, 160, True),
+    'card': (480, 320, True),
+    'full': (1280, 1280, False),
+}
+RENDITION_FORMATS = {'jpeg': 'jpg', 'webp': 'webp'}
+RENDITION_QUALITY = 85
+RENDITION_WORKERS = 2
+RENDITIONS_DIR = 'recipes/renditions'
+RENDITION_BACKGROUND = (255, 255, 255)
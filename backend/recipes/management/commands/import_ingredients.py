@@ -0,0 +1,199 @@
+import csv
+import io
+import json
+import os
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from recipes.constants import (CATALOG_VERSION, IMPORT_BATCH_SIZE,
+                               IMPORT_READ_SIZE)
+from recipes.models import Ingredient, IngredientRecipe
+from recipes.utils import normalize_search_name
+from recipes.versions import bump_version
+
+STAGING_TABLE = 'ingredient_import'
+
+
+def iter_json_array(file, read_size=IMPORT_READ_SIZE):
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if position >= len(buffer):
+            chunk = file.read(read_size)
+            if not chunk:
+                raise CommandError('Неожиданный конец JSON файла.')
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        if not started:
+            if buffer[position] != '[':
+                raise CommandError('JSON файл должен содержать массив.')
+            started = True
+            position += 1
+            continue
+        if buffer[position] == ']':
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = file.read(read_size)
+            if not chunk:
+                raise CommandError('Некорректный JSON файл.')
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield item['name'], item['measurement_unit']
+        if position >= read_size:
+            buffer = buffer[position:]
+            position = 0
+
+
+def iter_csv_rows(file):
+    for row in csv.reader(file):
+        if not row:
+            continue
+        if len(row) != 2:
+            raise CommandError(f'Некорректная строка CSV: {row}')
+        yield row[0], row[1]
+
+
+def iter_batches(rows, batch_size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+class Command(BaseCommand):
+    help = 'Загружает ингредиенты из JSON или CSV файла.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', type=str,
+                            help='Путь до JSON или CSV файла.')
+        parser.add_argument('--format', choices=('json', 'csv'),
+                            help='Формат файла, по умолчанию по расширению.')
+        parser.add_argument('--batch-size', type=int,
+                            default=IMPORT_BATCH_SIZE,
+                            help='Количество записей в одной пачке.')
+        parser.add_argument('--copy', action='store_true',
+                            help='Загрузка через COPY (только PostgreSQL).')
+        parser.add_argument('--sync', action='store_true',
+                            help='Удалить неиспользуемые ингредиенты, '
+                                 'которых нет в файле.')
+
+    def get_rows(self, file, file_format):
+        if file_format == 'csv':
+            return iter_csv_rows(file)
+        return iter_json_array(file)
+
+    def upsert_batch(self, batch):
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=name, measurement_unit=measurement_unit,
+                        search_name=normalize_search_name(name))
+             for name, measurement_unit in batch],
+            update_conflicts=True,
+            unique_fields=('name', 'measurement_unit'),
+            update_fields=('search_name',),
+        )
+
+    def import_with_orm(self, rows, batch_size, sync):
+        keys = set()
+        total = 0
+        for batch in iter_batches(rows, batch_size):
+            batch = list(dict.fromkeys(batch))
+            with transaction.atomic():
+                self.upsert_batch(batch)
+            total += len(batch)
+            if sync:
+                keys.update(batch)
+        deleted = 0
+        if sync:
+            stale_ids = [
+                pk for pk, name, measurement_unit
+                in Ingredient.objects.values_list(
+                    'id', 'name', 'measurement_unit').iterator()
+                if (name, measurement_unit) not in keys
+            ]
+            for ids in iter_batches(stale_ids, batch_size):
+                deleted += Ingredient.objects.filter(
+                    id__in=ids, recipes__isnull=True).delete()[0]
+        return total, deleted
+
+    def copy_batch(self, cursor, batch):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for name, measurement_unit in batch:
+            writer.writerow(
+                (name, measurement_unit, normalize_search_name(name)))
+        buffer.seek(0)
+        cursor.copy_expert(
+            f'COPY {STAGING_TABLE} (name, measurement_unit, search_name) '
+            'FROM STDIN WITH (FORMAT csv)', buffer)
+
+    @transaction.atomic
+    def import_with_copy(self, rows, batch_size, sync):
+        table = Ingredient._meta.db_table
+        recipe_table = IngredientRecipe._meta.db_table
+        total = 0
+        deleted = 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMPORARY TABLE {STAGING_TABLE} '
+                '(name text, measurement_unit text, search_name text) '
+                'ON COMMIT DROP')
+            for batch in iter_batches(rows, batch_size):
+                self.copy_batch(cursor, batch)
+                total += len(batch)
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit, search_name) '
+                'SELECT DISTINCT name, measurement_unit, search_name '
+                f'FROM {STAGING_TABLE} '
+                'ON CONFLICT (name, measurement_unit) '
+                'DO UPDATE SET search_name = EXCLUDED.search_name')
+            if sync:
+                cursor.execute(
+                    f'DELETE FROM {table} i WHERE NOT EXISTS ('
+                    f'SELECT 1 FROM {STAGING_TABLE} s '
+                    'WHERE s.name = i.name '
+                    'AND s.measurement_unit = i.measurement_unit'
+                    f') AND NOT EXISTS (SELECT 1 FROM {recipe_table} r '
+                    'WHERE r.ingredient_id = i.id)')
+                deleted = cursor.rowcount
+        return total, deleted
+
+    def handle(self, *args, **options):
+        path = options['file']
+        file_format = options['format'] or (
+            'csv' if path.lower().endswith('.csv') else 'json')
+        batch_size = options['batch_size']
+        if batch_size <= 0:
+            raise CommandError('Размер пачки должен быть положительным.')
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('--copy поддерживается только PostgreSQL.')
+        self.stdout.write(f'Loading {file_format.upper()} file: '
+                          f'{os.path.abspath(path)}')
+
+        started = time.monotonic()
+        with open(path, 'r', encoding='utf-8', newline='') as file:
+            rows = self.get_rows(file, file_format)
+            if options['copy']:
+                total, deleted = self.import_with_copy(
+                    rows, batch_size, options['sync'])
+            else:
+                total, deleted = self.import_with_orm(
+                    rows, batch_size, options['sync'])
+        elapsed = time.monotonic() - started
+        bump_version(CATALOG_VERSION)
+
+        rate = total / elapsed if elapsed else total
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные загружены в БД: {total} записей за {elapsed:.2f} с '
+            f'({rate:.0f} записей/с), удалено: {deleted}.'))
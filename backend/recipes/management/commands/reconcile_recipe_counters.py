@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+from recipes.constants import RECONCILE_BATCH_SIZE
+from recipes.models import BuyList, Favorite, Recipe
+
+
+def count_by_recipe(model, ids):
+    return dict(
+        model.objects.filter(recipe_id__in=ids).order_by()
+        .values('recipe_id').annotate(total=Count('id'))
+        .values_list('recipe_id', 'total'))
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики избранного и корзины у рецептов '
+            'и исправляет расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=RECONCILE_BATCH_SIZE,
+                            help='Количество рецептов в одной пачке.')
+
+    @transaction.atomic
+    def reconcile_batch(self, ids):
+        recipes = list(Recipe.objects.select_for_update().filter(
+            id__in=ids).only('id', 'favorites_count', 'in_carts_count'))
+        favorites = count_by_recipe(Favorite, ids)
+        carts = count_by_recipe(BuyList, ids)
+        drifted = []
+        for recipe in recipes:
+            favorites_count = favorites.get(recipe.id, 0)
+            in_carts_count = carts.get(recipe.id, 0)
+            if (recipe.favorites_count, recipe.in_carts_count) != (
+                    favorites_count, in_carts_count):
+                recipe.favorites_count = favorites_count
+                recipe.in_carts_count = in_carts_count
+                drifted.append(recipe)
+        Recipe.objects.bulk_update(
+            drifted, ('favorites_count', 'in_carts_count'))
+        return len(drifted)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size <= 0:
+            raise CommandError('Размер пачки должен быть положительным.')
+        last_id = 0
+        checked = 0
+        fixed = 0
+        while True:
+            ids = list(Recipe.objects.filter(id__gt=last_id).order_by('id')
+                       .values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            fixed += self.reconcile_batch(ids)
+            checked += len(ids)
+            last_id = ids[-1]
+        self.stdout.write(self.style.SUCCESS(
+            f'Проверено рецептов: {checked}, исправлено: {fixed}.'))
@@ -0,0 +1,46 @@
+import time
+from concurrent.futures import as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+from recipes.constants import RENDITION_WORKERS
+from recipes.models import Recipe
+from recipes.renditions import create_executor, render_renditions
+
+
+class Command(BaseCommand):
+    help = 'Создаёт уменьшенные копии изображений рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=RENDITION_WORKERS,
+                            help='Количество процессов.')
+        parser.add_argument('--force', action='store_true',
+                            help='Пересоздать уже существующие копии.')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        if workers <= 0:
+            raise CommandError('Количество процессов должно быть '
+                               'положительным.')
+        names = (Recipe.objects.exclude(image='').order_by()
+                 .values_list('image', flat=True).distinct())
+        started = time.monotonic()
+        images = 0
+        files = 0
+        failed = 0
+        with create_executor(workers) as executor:
+            futures = {
+                executor.submit(render_renditions, name, options['force']):
+                name for name in names.iterator()
+            }
+            for future in as_completed(futures):
+                try:
+                    files += future.result()
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f'{futures[future]}: {error}')
+                else:
+                    images += 1
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {images}, записано файлов: {files}, '
+            f'ошибок: {failed} за {elapsed:.2f} с.'))
@@ -0,0 +1,55 @@
+from django.db import migrations, models
+
+from recipes.utils import normalize_search_name
+
+BATCH_SIZE = 1000
+
+
+def fill_search_name(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    ingredients = list(Ingredient.objects.only('id', 'name'))
+    for ingredient in ingredients:
+        ingredient.search_name = normalize_search_name(ingredient.name)
+    Ingredient.objects.bulk_update(ingredients, ('search_name',),
+                                   batch_size=BATCH_SIZE)
+
+
+def move_substring_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'DROP INDEX IF EXISTS recipes_ingredient_upper_name_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS recipes_ingredient_search_name_trgm '
+        'ON recipes_ingredient USING gin (search_name gin_trgm_ops)')
+
+
+def restore_substring_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'DROP INDEX IF EXISTS recipes_ingredient_search_name_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS recipes_ingredient_upper_name_trgm '
+        'ON recipes_ingredient USING gin (UPPER(name) gin_trgm_ops)')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_ingredient_name_trigram_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='search_name',
+            field=models.CharField(default='', editable=False, max_length=150, verbose_name='Ключ поиска'),
+        ),
+        migrations.RunPython(fill_search_name, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['search_name'], name='ingredient_search_name_idx', opclasses=['text_pattern_ops']),
+        ),
+        migrations.RunPython(move_substring_index, restore_substring_index),
+    ]
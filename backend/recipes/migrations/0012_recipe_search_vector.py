@@ -0,0 +1,70 @@
+import django.contrib.postgres.search
+from django.db import migrations
+
+from recipes.constants import RECIPE_SEARCH_CONFIG
+from recipes.utils import get_search_tokens
+
+BATCH_SIZE = 1000
+
+SEARCH_VECTOR_SQL = (
+    f"setweight(to_tsvector('{RECIPE_SEARCH_CONFIG}', "
+    "coalesce({table}.name, '')), 'A') || "
+    f"setweight(to_tsvector('{RECIPE_SEARCH_CONFIG}', "
+    "coalesce({table}.text, '')), 'B')"
+)
+
+
+def create_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        Recipe = apps.get_model('recipes', 'Recipe')
+        recipes = list(Recipe.objects.only('id', 'name', 'text'))
+        for recipe in recipes:
+            recipe.search_vector = ' '.join(
+                get_search_tokens(f'{recipe.name} {recipe.text}'))
+        Recipe.objects.bulk_update(recipes, ('search_vector',),
+                                   batch_size=BATCH_SIZE)
+        return
+    schema_editor.execute(
+        'CREATE OR REPLACE FUNCTION recipes_recipe_search_vector_update() '
+        'RETURNS trigger AS $$ BEGIN '
+        f'NEW.search_vector := {SEARCH_VECTOR_SQL.format(table="NEW")}; '
+        'RETURN NEW; END $$ LANGUAGE plpgsql')
+    schema_editor.execute(
+        'CREATE TRIGGER recipes_recipe_search_vector_trigger '
+        'BEFORE INSERT OR UPDATE OF name, text, search_vector '
+        'ON recipes_recipe FOR EACH ROW '
+        'EXECUTE FUNCTION recipes_recipe_search_vector_update()')
+    schema_editor.execute(
+        'UPDATE recipes_recipe SET search_vector = '
+        f'{SEARCH_VECTOR_SQL.format(table="recipes_recipe")}')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS recipes_recipe_search_vector_gin '
+        'ON recipes_recipe USING gin (search_vector)')
+
+
+def drop_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'DROP INDEX IF EXISTS recipes_recipe_search_vector_gin')
+    schema_editor.execute(
+        'DROP TRIGGER IF EXISTS recipes_recipe_search_vector_trigger '
+        'ON recipes_recipe')
+    schema_editor.execute(
+        'DROP FUNCTION IF EXISTS recipes_recipe_search_vector_update()')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipe_favorites_count_recipe_in_carts_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(create_search_vector, drop_search_vector),
+    ]
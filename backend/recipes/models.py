@@ -1,13 +1,15 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 from django.db.models import UniqueConstraint
 
-from .constants import (CHARS_MAX_LEN, HEX_COLOR_MAX_LEN,
+from .constants import (CHARS_MAX_LEN, HEX_COLOR_MAX_LEN, IMAGE_NAME_MAX_LEN,
                         MAX_AMOUNT_INGREDIENT, MAX_COOKING_TIME,
                         MEASUREMENT_UNIT_MAX_LEN, MIN_AMOUNT_INGREDIENT,
                         MIN_COOKING_TIME, RECIPE_NAME_MAX_LEN,
                         RECIPE_TEXT_MAX_LEN, STR_REPR_LEN)
+from .utils import get_search_tokens, normalize_search_name
 from .validators import validate_hex_color
 
 User = get_user_model()
@@ -24,6 +26,12 @@ class Ingredient(models.Model):
         max_length=MEASUREMENT_UNIT_MAX_LEN,
         verbose_name='Единица измерения'
     )
+    search_name = models.CharField(
+        max_length=CHARS_MAX_LEN,
+        editable=False,
+        default='',
+        verbose_name='Ключ поиска'
+    )
 
     class Meta:
         verbose_name = 'Ингредиент'
@@ -35,10 +43,20 @@ class Ingredient(models.Model):
             violation_error_message='Запись ингредиент-ед._измерения уже есть.'
         )
         ]
+        indexes = [models.Index(
+            fields=('search_name',),
+            name='ingredient_search_name_idx',
+            opclasses=['text_pattern_ops']
+        )
+        ]
 
     def __str__(self):
         return self.name[:STR_REPR_LEN]
 
+    def save(self, *args, **kwargs):
+        self.search_name = normalize_search_name(self.name)
+        super().save(*args, **kwargs)
+
 
 class Tag(models.Model):
 
@@ -94,6 +112,12 @@ class Recipe(models.Model):
         upload_to='recipes/images/',
         verbose_name='Фото'
     )
+    renditions_image = models.CharField(
+        max_length=IMAGE_NAME_MAX_LEN,
+        blank=True,
+        editable=False,
+        verbose_name='Фото, для которого готовы копии'
+    )
     tag = models.ManyToManyField(
         to=Tag,
         related_name='recipes',
@@ -111,15 +135,45 @@ class Recipe(models.Model):
         auto_now_add=True,
         db_index=True
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество добавлений в избранное'
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество добавлений в корзину'
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор'
+    )
 
     class Meta:
         ordering = ('-pub_date', 'id',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [models.Index(
+            fields=('pub_date', 'id'),
+            name='recipe_pub_date_id_idx'
+        )
+        ]
 
     def __str__(self):
         return self.name[:STR_REPR_LEN]
 
+    def save(self, *args, **kwargs):
+        # В PostgreSQL вектор пересчитывает триггер, для остальных СУБД
+        # здесь хранятся нормализованные слова названия и описания.
+        self.search_vector = ' '.join(
+            get_search_tokens(f'{self.name} {self.text}'))
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'name', 'text'} & set(update_fields):
+            kwargs['update_fields'] = (*update_fields, 'search_vector')
+        super().save(*args, **kwargs)
+
 
 class IngredientRecipe(models.Model):
 
@@ -179,6 +233,8 @@ class BaseUserRecipeRelation(models.Model):
 
 class Favorite(BaseUserRecipeRelation):
 
+    counter_field = 'favorites_count'
+
     class Meta:
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранное'
@@ -189,6 +245,8 @@ class Favorite(BaseUserRecipeRelation):
 
 class BuyList(BaseUserRecipeRelation):
 
+    counter_field = 'in_carts_count'
+
     class Meta:
         verbose_name = 'Корзина'
         verbose_name_plural = 'Корзины'
@@ -0,0 +1,148 @@
+import hashlib
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from .constants import (RECIPE_IMAGE_RENDITIONS, RENDITION_BACKGROUND,
+                        RENDITION_FORMATS, RENDITION_QUALITY,
+                        RENDITION_WORKERS, RENDITIONS_DIR)
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_rendition_name(image_name, rendition, image_format):
+    # Загрузки называются одинаково (image.png), поэтому имя копии
+    # различается по хешу полного пути исходного файла.
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    digest = hashlib.sha1(image_name.encode()).hexdigest()[:16]
+    return (f'{RENDITIONS_DIR}/{stem}_{digest}_{rendition}.'
+            f'{RENDITION_FORMATS[image_format]}')
+
+
+def get_rendition_urls(recipe):
+    """Ссылки на копии, если они уже созданы для текущего фото рецепта."""
+    image_name = recipe.image.name
+    if not image_name or recipe.renditions_image != image_name:
+        return {}
+    return {
+        rendition: {
+            image_format: default_storage.url(
+                get_rendition_name(image_name, rendition, image_format))
+            for image_format in RENDITION_FORMATS
+        }
+        for rendition in RECIPE_IMAGE_RENDITIONS
+    }
+
+
+def to_rgb(image):
+    # Прозрачный фон при convert('RGB') становится чёрным.
+    if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+        image = image.convert('RGBA')
+        background = Image.new('RGBA', image.size, RENDITION_BACKGROUND)
+        image = Image.alpha_composite(background, image)
+    return image.convert('RGB')
+
+
+def mark_renditions_ready(image_name):
+    # save() вместо update(): сигналы сбросят кеш карточек рецептов.
+    recipes = Recipe.objects.filter(image=image_name).exclude(
+        renditions_image=image_name)
+    for recipe in recipes:
+        recipe.renditions_image = image_name
+        recipe.save(update_fields=['renditions_image'])
+
+
+def resize(image, width, height, crop):
+    if crop:
+        return ImageOps.fit(image, (width, height), Image.LANCZOS)
+    image = image.copy()
+    image.thumbnail((width, height), Image.LANCZOS)
+    return image
+
+
+def render_renditions(image_name, force=False):
+    """Сохраняет уменьшенные копии изображения без EXIF.
+
+    Отмечает рецепты с этим фото как готовые и возвращает количество
+    записанных файлов.
+    """
+    names = {
+        (rendition, image_format): get_rendition_name(
+            image_name, rendition, image_format)
+        for rendition in RECIPE_IMAGE_RENDITIONS
+        for image_format in RENDITION_FORMATS
+    }
+    if not force and all(default_storage.exists(name)
+                         for name in names.values()):
+        mark_renditions_ready(image_name)
+        return 0
+    with default_storage.open(image_name) as file, Image.open(file) as source:
+        image = to_rgb(ImageOps.exif_transpose(source))
+    for rendition, (width, height, crop) in RECIPE_IMAGE_RENDITIONS.items():
+        resized = resize(image, width, height, crop)
+        for image_format in RENDITION_FORMATS:
+            buffer = io.BytesIO()
+            resized.save(buffer, image_format, quality=RENDITION_QUALITY,
+                         optimize=True)
+            name = names[rendition, image_format]
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            default_storage.save(name, ContentFile(buffer.getvalue()))
+    mark_renditions_ready(image_name)
+    return len(names)
+
+
+def init_worker():
+    django.setup()
+
+
+def create_executor(workers=RENDITION_WORKERS):
+    return ProcessPoolExecutor(max_workers=workers, initializer=init_worker)
+
+
+def get_executor(broken=None):
+    """Общий пул процессов; сломанный пул broken пересоздаётся."""
+    global _executor
+    with _executor_lock:
+        if _executor is None or _executor is broken:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = create_executor()
+        return _executor
+
+
+def log_render_error(image_name, future):
+    if future.cancelled() or future.exception() is None:
+        return
+    logger.error('Не удалось создать копии изображения %s', image_name,
+                 exc_info=future.exception())
+
+
+def schedule_renditions(image_name):
+    """Ставит генерацию копий в пул процессов после коммита транзакции."""
+
+    def submit():
+        executor = get_executor()
+        try:
+            future = executor.submit(render_renditions, image_name)
+        except BrokenProcessPool:
+            future = get_executor(broken=executor).submit(
+                render_renditions, image_name)
+        future.add_done_callback(
+            lambda future: log_render_error(image_name, future))
+
+    if image_name:
+        transaction.on_commit(submit, robust=True)
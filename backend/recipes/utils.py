@@ -0,0 +1,11 @@
+import re
+
+WORD_RE = re.compile(r'\w+')
+
+
+def normalize_search_name(value):
+    return ' '.join(value.casefold().replace('ё', 'е').split())
+
+
+def get_search_tokens(value):
+    return list(dict.fromkeys(WORD_RE.findall(normalize_search_name(value))))
@@ -0,0 +1,53 @@
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def _version_key(name):
+    return f'version:{name}'
+
+
+def get_version(name):
+    key = _version_key(name)
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_version(name):
+    def bump():
+        key = _version_key(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+
+    transaction.on_commit(bump)
+
+
+class VersionedState:
+    """Данные в памяти процесса, перестраиваемые при смене версии."""
+
+    version_name = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = None
+
+    def build(self, version):
+        raise NotImplementedError
+
+    def get_state(self):
+        version = get_version(self.version_name)
+        state = self._state
+        if state is None or state[0] != version:
+            with self._lock:
+                if self._state is None or self._state[0] != version:
+                    self._state = (version, self.build(version))
+                state = self._state
+        return state[1]
@@ -318,7 +318,7 @@ class Api {
   getIngredients ({ name }) {
     const token = localStorage.getItem('token')
     return fetch(
-      `/api/ingredients/?name=${name}`,
+      `/api/ingredients/?name=${name}&mode=autocomplete`,
       {
         method: 'GET',
         headers: {
@@ -326,6 +326,7 @@ class Api {
         }
       }
     ).then(this.checkResponse)
+      .then(({ results }) => results)
   }
 
   // tags